@@ -7,6 +7,10 @@ GameWiki Fetcher - Web界面
 """
 
 import os
+import io
+import errno
+import codecs
+import csv
 import sys
 import json
 import time
@@ -14,18 +18,61 @@ import threading
 import logging
 import shutil
 import hashlib
+import itertools
+import functools
+import gzip
 import requests
+from requests.adapters import HTTPAdapter
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, wait, FIRST_COMPLETED
 from datetime import datetime
-from flask import Flask, render_template, request, redirect, url_for, jsonify, flash, send_from_directory
+from flask import Flask, render_template, request, redirect, url_for, jsonify, flash, send_from_directory, has_request_context
 from flask_bootstrap import Bootstrap
 from flask_wtf import FlaskForm, CSRFProtect
 from wtforms import StringField, IntegerField, BooleanField, FloatField, SubmitField, SelectField
+from wtforms.fields.core import UnboundField
 from wtforms.validators import DataRequired, NumberRange, URL, Optional
-from urllib.parse import urlparse, urljoin
+from urllib.parse import urlparse, urljoin, urldefrag
 import re
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, Tag
+from bs4.dammit import EncodingDetector
 import random
 
+# 安装brotli解码器时才声明接受br压缩，否则requests无法解压响应
+try:
+    import brotli
+    ACCEPT_ENCODING = 'gzip, deflate, br'
+except ImportError:
+    try:
+        import brotlicffi
+        ACCEPT_ENCODING = 'gzip, deflate, br'
+    except ImportError:
+        ACCEPT_ENCODING = 'gzip, deflate'
+
+# 安装xxhash时用xxh3计算URL去重键和文件名摘要
+try:
+    import xxhash
+    XXHASH_AVAILABLE = True
+except ImportError:
+    XXHASH_AVAILABLE = False
+
+# 安装lmdb时把抓取状态保存到磁盘，支持断点续爬
+try:
+    import lmdb
+    LMDB_AVAILABLE = True
+except ImportError:
+    LMDB_AVAILABLE = False
+
+# 优先使用C实现的lxml解析器，未安装时退回到纯Python的html.parser
+try:
+    import lxml.html
+    from lxml import etree
+    LXML_AVAILABLE = True
+    HTML_PARSER = 'lxml'
+except ImportError:
+    LXML_AVAILABLE = False
+    HTML_PARSER = 'html.parser'
+
 # 添加项目根目录到Python路径
 current_dir = os.path.dirname(os.path.abspath(__file__))
 parent_dir = os.path.dirname(current_dir)  # src目录
@@ -40,22 +87,66 @@ except ImportError as e:
     print(f"Python路径: {sys.path}")
     raise
 
+# 保存Web界面配置的.env文件
+ENV_PATH = os.path.join(root_dir, '.env')
+
 # 创建Flask应用
 template_folder = os.path.join(current_dir, 'templates')
 static_folder = os.path.join(current_dir, 'static')
 app = Flask(__name__, template_folder=template_folder, static_folder=static_folder)
 app.config['SECRET_KEY'] = os.urandom(24)  # 使用随机生成的密钥
 app.config['BOOTSTRAP_SERVE_LOCAL'] = True
+# 部署在nginx/Apache之后时设置USE_X_SENDFILE=1，由前端服务器直接发送文件
+app.config['USE_X_SENDFILE'] = os.environ.get('USE_X_SENDFILE') == '1'
 
 # 初始化扩展
 bootstrap = Bootstrap(app)
 csrf = CSRFProtect(app)  # 启用CSRF保护
 
+# 抓取和整理各自同时只运行一个后台任务；任务是否在运行以Future的状态为准
+_current_fetch = None
+_current_organize = None
+# 保护检查任务状态和提交任务的过程，避免并发请求重复提交
+_task_lock = threading.Lock()
+# 请求停止抓取的信号
+_stop_event = threading.Event()
+
+def _is_running():
+    """是否有正在运行的抓取任务"""
+    return _current_fetch is not None and not _current_fetch.done()
+
+def _is_organizing():
+    """是否有正在运行的整理任务"""
+    return _current_organize is not None and not _current_organize.done()
+
+def _should_stop():
+    """抓取是否应当停止"""
+    return _stop_event.is_set()
+
+def _start_background(func, *args, name=None):
+    """在守护线程中运行后台任务，返回反映任务状态的Future
+    
+    使用守护线程而不是线程池，退出程序时不必等待抓取或整理结束
+    """
+    future = Future()
+    
+    def run():
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            result = func(*args)
+        except BaseException as e:
+            future.set_exception(e)
+        else:
+            future.set_result(result)
+    
+    threading.Thread(target=run, name=name, daemon=True).start()
+    return future
+
+# 开始/结束时间和索引页整理时间的显示格式
+_TS_FMT = '%Y-%m-%d %H:%M:%S'
+
 # 全局变量
-fetcher_thread = None
-organize_thread = None
-is_running = False
-is_organizing = False
 progress = {
     'total': 0,
     'current': 0,
@@ -63,21 +154,45 @@ progress = {
     'start_time': None,
     'end_time': None,
     'log_messages': [],
+    'log_seq': 0,
     'pages_count': 0,
     'images_count': 0,
     'error_count': 0,
-    'processing_speed': 0
+    'processing_speed': 0,
+    '_ver': 0
 }
+# 保护progress中计数器的读-改-写操作，多个工作线程会同时累加
+progress_lock = threading.Lock()
+# 进度或日志变化时通知/events推送，与progress_lock共用同一把锁
+progress_changed = threading.Condition(progress_lock)
+
+def _incr_progress(key, amount=1):
+    """原子地累加进度计数器"""
+    with progress_lock:
+        progress[key] += amount
+        progress['_ver'] += 1
+        progress_changed.notify_all()
+
+def _set_progress(key, value):
+    """设置进度字段，值有变化时递增版本号（/progress据此生成ETag）"""
+    with progress_lock:
+        if progress.get(key) != value:
+            progress[key] = value
+            progress['_ver'] += 1
+            progress_changed.notify_all()
 
 # 自定义日志处理器
 class WebLogHandler(logging.Handler):
     """将日志消息发送到Web界面"""
     
-    def __init__(self, max_messages=100):
+    def __init__(self, max_messages=500):
         """初始化处理器"""
         super().__init__()
         self.max_messages = max_messages
-        self.messages = []
+        # 超出上限时自动丢弃最早的消息
+        self.messages = deque(maxlen=max_messages)
+        # 已收到的消息总数，客户端据此只获取新增的消息
+        self.seq = 0
     
     def emit(self, record):
         """处理日志记录"""
@@ -90,15 +205,126 @@ class WebLogHandler(logging.Handler):
             'message': self.format(record)
         }
         
-        # 添加到消息列表
+        # 添加到消息列表（emit在处理器锁内调用）
         self.messages.append(log_entry)
+        self.seq += 1
+        with progress_changed:
+            progress['log_seq'] = self.seq
+            progress_changed.notify_all()
         
-        # 限制消息数量
-        if len(self.messages) > self.max_messages:
-            self.messages = self.messages[-self.max_messages:]
+        # 进度信息被重置后重新指向消息列表
+        if progress['log_messages'] is not self.messages:
+            progress['log_messages'] = self.messages
+    
+    def snapshot(self, since=None):
+        """在处理器锁内复制消息，返回(消息总数, 消息列表)
         
-        # 更新全局进度信息
-        progress['log_messages'] = self.messages
+        指定since时只返回序号大于since的消息；since超过当前总数（例如服务重启）时返回全部消息
+        """
+        with self.lock:
+            seq = self.seq
+            if since is None or since > seq:
+                return seq, list(self.messages)
+            start = max(len(self.messages) - (seq - since), 0)
+            return seq, list(itertools.islice(self.messages, start, None))
+
+# 预编译的正则表达式
+_IMG_EXT_RE = re.compile(r'\.(?:jpg|jpeg|png|gif|webp|svg)(?:\?.*)?$', re.I)
+_IMG_FILE_RE = re.compile(r'\.(?:jpg|jpeg|png|gif|webp|svg)$', re.I)
+_TITLE_SUFFIX_RE = re.compile(r'\s*[-|]\s*.*?$')
+_FN_BAD_RE = re.compile(r'[\\/*?:"<>|]')
+_FN_WS_RE = re.compile(r'\s+')
+_WIKI_NAME_SANITIZE = re.compile(r'[^\w\-]')
+
+# URL去重键使用的摘要算法，记录在抓取状态中，算法不同时不能续爬
+_URL_KEY_ALGO = b'xxh3_64' if XXHASH_AVAILABLE else b'blake2b_64'
+
+def _url_key(url):
+    """计算URL的去重键
+    
+    去掉片段标识后取64位摘要（xxh3，未安装xxhash时使用8字节blake2b）作为整数，
+    集合中只保存整数而不是完整URL字符串
+    """
+    url = urldefrag(url)[0]
+    if XXHASH_AVAILABLE:
+        return xxhash.xxh3_64_intdigest(url)
+    return int.from_bytes(hashlib.blake2b(url.encode('utf-8'), digest_size=8).digest(), 'big')
+
+def _name_hash(text):
+    """计算用于生成文件名的16位十六进制摘要
+    
+    仅用于区分文件名，不需要密码学强度；未安装xxhash时使用8字节blake2b
+    """
+    if XXHASH_AVAILABLE:
+        return xxhash.xxh3_64_hexdigest(text)
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=8).hexdigest()
+
+@functools.lru_cache(maxsize=8192)
+def _netloc_of(url):
+    """获取URL的网络位置（主机名和端口），结果缓存以加速重复URL的判断"""
+    return urlparse(url).netloc
+
+def _header_charset(headers):
+    """返回Content-Type响应头中声明的字符集，未声明时返回None
+    
+    requests对未声明字符集的text/*响应默认返回ISO-8859-1，这里不采用该默认值
+    """
+    if 'charset' not in headers.get('content-type', '').lower():
+        return None
+    return requests.utils.get_encoding_from_headers(headers)
+
+def _sniff_encoding(data, header_encoding=None):
+    """确定页面编码，依次使用BOM、响应头中的字符集和<meta>声明，都没有时按UTF-8处理
+    
+    只检查文档开头，不解码整个页面
+    """
+    _, encoding = EncodingDetector.strip_byte_order_mark(data)
+    if encoding:
+        return encoding
+    for encoding in (header_encoding, EncodingDetector.find_declared_encoding(data, is_html=True)):
+        if encoding:
+            try:
+                codecs.lookup(encoding)
+                return encoding
+            except LookupError:
+                pass
+    return 'utf-8'
+
+def _class_xpath(class_name):
+    """生成按class匹配元素的XPath表达式"""
+    return f".//*[contains(concat(' ', normalize-space(@class), ' '), ' {class_name} ')]"
+
+# 主要内容区域的查找顺序，预先展开为BeautifulSoup.find的(标签名, 属性)参数
+_CONTENT_FIND_ARGS = (
+    (None, {'id': 'mw-content-text'}),      # MediaWiki
+    (None, {'id': 'bodyContent'}),          # MediaWiki
+    (None, {'class': 'mw-parser-output'}),  # MediaWiki
+    ('article', {}),                        # 常见文章标签
+    (None, {'class': 'content'}),           # 常见内容类
+    (None, {'id': 'content'}),              # 常见内容ID
+    ('main', {}),                           # HTML5主要内容标签
+)
+
+# lxml元素树中使用的同一查找顺序
+if LXML_AVAILABLE:
+    _CONTENT_XPATHS = [etree.XPath(expr) for expr in (
+        ".//*[@id='mw-content-text']",  # MediaWiki
+        ".//*[@id='bodyContent']",      # MediaWiki
+        _class_xpath('mw-parser-output'),  # MediaWiki
+        ".//article",                   # 常见文章标签
+        _class_xpath('content'),        # 常见内容类
+        ".//*[@id='content']",          # 常见内容ID
+        ".//main",                      # HTML5主要内容标签
+    )]
+
+# 解析时需要处理的标签
+_STREAM_TAGS = ('title', 'a', 'img', 'head', 'script', 'style')
+
+# 抓取状态数据库的最大映射大小（Windows下会按此大小预分配文件）
+_STATE_MAP_SIZE = 1 << 28
+
+# 标题标签与Markdown标题级别的对应关系
+_HEADING_LEVELS = {'h1': 1, 'h2': 2, 'h3': 3, 'h4': 4, 'h5': 5, 'h6': 6}
 
 # 简化的Wiki爬虫类
 class SimpleWikiFetcher:
@@ -116,10 +342,12 @@ class SimpleWikiFetcher:
         self.threads = config['threads']
         self.save_html = config['save_html']
         self.max_retries = config.get('max_retries', 3)
+        self.resume = config.get('resume', False)
         
         # 解析基础URL
         parsed_url = urlparse(self.base_url)
         self.domain = f"{parsed_url.scheme}://{parsed_url.netloc}"
+        self._netloc = parsed_url.netloc
         
         # 创建会话
         self.session = requests.Session()
@@ -127,15 +355,40 @@ class SimpleWikiFetcher:
             'User-Agent': self.user_agent,
             'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
             'Accept-Language': 'zh-CN,zh;q=0.8,en-US;q=0.5,en;q=0.3',
+            'Accept-Encoding': ACCEPT_ENCODING,
+            'Connection': 'keep-alive',
         })
         
-        # 初始化URL队列和已访问URL集合
-        self.url_queue = []
+        # 按线程数调整连接池大小，保证每个工作线程都能复用已建立的连接
+        adapter = HTTPAdapter(
+            pool_connections=max(self.threads, 10),
+            pool_maxsize=max(self.threads * 2, 20),
+            pool_block=False,
+            max_retries=0
+        )
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        
+        # 初始化URL队列和已访问URL集合（集合中保存_url_key计算的去重键）
+        self.url_queue = deque()
         self.visited_urls = set()
         
+        # 已加入过队列的URL的去重键，避免同一URL被重复入队
+        self.enqueued_urls = set()
+        
+        # 保护visited_urls、enqueued_urls和url_queue的锁，工作线程会并发访问
+        self._lock = threading.Lock()
+        
         # 创建必要的目录
         self._create_directories()
         
+        # 抓取状态数据库，记录已完成的URL和待抓取队列
+        self._state_env = None
+        if LMDB_AVAILABLE:
+            self._open_state()
+        elif self.resume:
+            logging.warning("未安装lmdb，无法断点续爬，将重新开始抓取")
+        
         logging.info(f"SimpleWikiFetcher初始化完成，基础URL: {self.base_url}, 输出目录: {self.output_dir}")
     
     def _create_directories(self):
@@ -156,13 +409,101 @@ class SimpleWikiFetcher:
         if self.save_html:
             os.makedirs(os.path.join(self.output_dir, 'html'), exist_ok=True)
     
+    def _open_state(self):
+        """打开保存抓取状态的LMDB数据库
+        
+        不续爬，或上次的状态属于另一个Wiki URL、使用了不同的URL去重键算法时，清空上次的状态。
+        写入时不等待落盘，异常退出时最多丢失最近的少量记录，续爬时重新抓取这些页面即可
+        """
+        self._state_env = lmdb.open(os.path.join(self.output_dir, '.state'),
+                                    map_size=_STATE_MAP_SIZE, subdir=True, max_dbs=3,
+                                    sync=False, metasync=False)
+        self._visited_db = self._state_env.open_db(b'visited')
+        self._queue_db = self._state_env.open_db(b'queue')
+        meta_db = self._state_env.open_db(b'meta')
+        
+        base_url = self.base_url.encode('utf-8')
+        with self._state_env.begin(write=True) as txn:
+            stored_url = txn.get(b'base_url', db=meta_db)
+            stored_algo = txn.get(b'url_key', db=meta_db)
+            if self.resume and stored_url is not None:
+                if stored_url != base_url:
+                    logging.warning(f"抓取状态属于其他Wiki URL: {stored_url.decode('utf-8', 'replace')}，"
+                                    f"将重新开始抓取")
+                elif stored_algo != _URL_KEY_ALGO:
+                    logging.warning("抓取状态使用了不同的URL去重键算法，将重新开始抓取")
+            if not self.resume or stored_url != base_url or stored_algo != _URL_KEY_ALGO:
+                txn.drop(self._visited_db, delete=False)
+                txn.drop(self._queue_db, delete=False)
+                txn.put(b'base_url', base_url, db=meta_db)
+                txn.put(b'url_key', _URL_KEY_ALGO, db=meta_db)
+    
+    def _restore_state(self):
+        """从状态数据库恢复已完成的URL和待抓取队列，返回恢复的待抓取URL数量"""
+        pending = []
+        with self._state_env.begin() as txn:
+            for key in txn.cursor(db=self._visited_db).iternext(values=False):
+                url_key = int.from_bytes(key, 'big')
+                self.visited_urls.add(url_key)
+                self.enqueued_urls.add(url_key)
+            
+            for key, value in txn.cursor(db=self._queue_db):
+                depth, url = value.decode('utf-8').split('\t', 1)
+                self.enqueued_urls.add(int.from_bytes(key, 'big'))
+                pending.append((url, int(depth)))
+        
+        # 数据库按键排序，恢复时按深度重新排列以保持广度优先的顺序
+        pending.sort(key=lambda item: item[1])
+        self.url_queue.extend(pending)
+        return len(pending)
+    
+    def _record_enqueued(self, items):
+        """在状态数据库中记录新加入队列的URL，items为(URL, 去重键, 深度)列表"""
+        if self._state_env is None or not items:
+            return
+        with self._state_env.begin(write=True) as txn:
+            for url, url_key, depth in items:
+                txn.put(url_key.to_bytes(8, 'big'), f"{depth}\t{url}".encode('utf-8'), db=self._queue_db)
+    
+    def _record_page(self, url_key, new_items):
+        """在一个事务中记录页面的处理结果
+        
+        把新加入队列的URL（(URL, 去重键, 深度)列表）写入待抓取队列，
+        并把当前页面从待抓取队列移到已完成集合
+        """
+        if self._state_env is None:
+            return
+        key = url_key.to_bytes(8, 'big')
+        with self._state_env.begin(write=True) as txn:
+            for url, item_key, depth in new_items:
+                txn.put(item_key.to_bytes(8, 'big'), f"{depth}\t{url}".encode('utf-8'), db=self._queue_db)
+            txn.put(key, b'', db=self._visited_db)
+            txn.delete(key, db=self._queue_db)
+    
     def start(self):
         """开始爬取"""
-        # 将起始URL添加到队列
-        self.url_queue.append((self.base_url, 0))
-        
-        # 开始爬取
-        self._crawl()
+        try:
+            # 续爬时恢复上次的状态，否则将起始URL添加到队列
+            restored = 0
+            if self.resume and self._state_env is not None:
+                restored = self._restore_state()
+            
+            if restored:
+                logging.info(f"从上次中断处继续抓取，待抓取URL: {restored}，已完成URL: {len(self.visited_urls)}")
+            else:
+                base_key = _url_key(self.base_url)
+                if base_key not in self.enqueued_urls:
+                    self.enqueued_urls.add(base_key)
+                    self._record_enqueued([(self.base_url, base_key, 0)])
+                self.url_queue.append((self.base_url, 0))
+            
+            # 开始爬取
+            self._crawl()
+        finally:
+            if self._state_env is not None:
+                self._state_env.sync(True)
+                self._state_env.close()
+                self._state_env = None
     
     def _crawl(self):
         """爬取Wiki页面"""
@@ -174,34 +515,36 @@ class SimpleWikiFetcher:
         
         logging.info(f"开始爬取，初始队列大小: {len(self.url_queue)}")
         
-        # 使用线程池并发爬取
-        from concurrent.futures import ThreadPoolExecutor
+        # 使用线程池并发爬取，任一任务完成即补充新任务，不再按批次等待
+        # 同时在途的任务数保持为线程数的两倍，既让线程池保持饱和，又能及时响应停止
+        max_inflight = self.threads * 2
         with ThreadPoolExecutor(max_workers=self.threads) as executor:
-            while self.url_queue and is_running:
-                # 获取当前队列中的所有URL
-                current_batch = self.url_queue.copy()
-                self.url_queue.clear()
+            inflight = set()
+            while not _should_stop():
+                # 从队列中补充任务
+                with self._lock:
+                    while self.url_queue and len(inflight) < max_inflight:
+                        url, depth = self.url_queue.popleft()
+                        inflight.add(executor.submit(self._process_url, url, depth))
                 
-                logging.info(f"处理批次，大小: {len(current_batch)}")
+                if not inflight:
+                    break
                 
-                # 提交任务到线程池
-                futures = [executor.submit(self._process_url, url, depth) 
-                          for url, depth in current_batch]
-                
-                # 等待所有任务完成
-                for future in futures:
+                # 等待任意一个任务完成，超时后重新检查是否被停止
+                done, inflight = wait(inflight, timeout=1, return_when=FIRST_COMPLETED)
+                for future in done:
                     try:
                         future.result()
                     except Exception as e:
                         logging.error(f"处理URL时发生错误: {str(e)}", exc_info=True)
-                        progress['error_count'] += 1
+                        _incr_progress('error_count')
                 
                 # 更新Web界面进度
-                progress['current'] = len(self.visited_urls)
-                progress['total'] = progress['current'] + len(self.url_queue)
+                _set_progress('current', len(self.visited_urls))
+                _set_progress('total', progress['current'] + len(self.url_queue) + len(inflight))
                 
                 # 更新页面计数
-                progress['pages_count'] = len(self.visited_urls)
+                _set_progress('pages_count', len(self.visited_urls))
                 
                 # 计算处理速度（每分钟处理的页面数）
                 current_time = time.time()
@@ -211,13 +554,14 @@ class SimpleWikiFetcher:
                     count_diff = current_processed - last_processed_count
                     if time_diff > 0:
                         speed = (count_diff / time_diff) * 60  # 每分钟处理数量
-                        progress['processing_speed'] = round(speed)
+                        _set_progress('processing_speed', round(speed))
                     
                     last_update_time = current_time
                     last_processed_count = current_processed
-                
-                # 添加延迟，避免请求过于频繁
-                time.sleep(0.1)
+            
+            # 任务被停止时取消尚未开始的任务
+            for future in inflight:
+                future.cancel()
         
         logging.info(f"爬取完成，共处理 {len(self.visited_urls)} 个URL")
     
@@ -225,60 +569,81 @@ class SimpleWikiFetcher:
         """处理单个URL"""
         global progress
         
-        # 如果已经访问过或超出最大深度，则跳过
-        if url in self.visited_urls or depth > self.max_depth:
+        # 超出最大深度则跳过
+        if depth > self.max_depth:
             return
         
-        # 标记为已访问
-        self.visited_urls.add(url)
+        # 检查并标记为已访问，加锁保证同一URL只被一个线程处理
+        with self._lock:
+            key = _url_key(url)
+            if key in self.visited_urls:
+                return
+            self.visited_urls.add(key)
         
         try:
             logging.info(f"正在处理URL: {url}, 深度: {depth}")
             
             # 获取页面内容
-            html_content = self._fetch_url(url)
-            if not html_content:
+            fetched = self._fetch_url(url)
+            if not fetched or not fetched[0]:
                 logging.warning(f"无法获取页面内容: {url}")
                 return
+            html_content, header_encoding = fetched
             
             # 解析页面内容
-            soup = BeautifulSoup(html_content, 'html.parser')
-            
-            # 获取页面标题
-            title = self._get_title(soup, url)
-            
-            # 获取页面内容
-            content = self._get_content(soup)
-            
-            # 获取页面链接
-            links = self._get_links(soup, url)
-            
-            # 获取页面图片
-            images = self._get_images(soup, url)
-            
-            # 获取页面表格
-            tables = self._get_tables(soup)
+            if LXML_AVAILABLE:
+                # 直接使用lxml解析一次，链接、图片和表格在C实现的元素树上提取，
+                # 只把主要内容区域交给BeautifulSoup转换为Markdown
+                tree, title, links, images = self._parse_tree(html_content, url, header_encoding)
+                main_html = lxml.html.tostring(self._find_main_content_tree(tree), encoding='unicode', with_tail=False)
+                content = self._get_content(BeautifulSoup(main_html, HTML_PARSER))
+                tables = self._get_tables_tree(tree)
+            else:
+                soup = BeautifulSoup(html_content, HTML_PARSER, from_encoding=header_encoding)
+                
+                # 获取页面标题
+                title = self._get_title(soup, url)
+                
+                # 获取页面内容
+                content = self._get_content(soup)
+                
+                # 获取页面链接
+                links = self._get_links(soup, url)
+                
+                # 获取页面图片
+                images = self._get_images(soup, url)
+                
+                # 获取页面表格
+                tables = self._get_tables(soup)
             
             # 保存页面内容
-            self._save_page(title, content, url, html_content)
+            self._save_page(title, content, url, html_content,
+                            image_count=len(images), table_count=len(tables))
             
             # 下载图片
             if self.download_images and images:
-                for img_url in images:
-                    self._download_image(img_url)
+                self._download_images(images)
             
             # 保存表格
             if self.download_tables and tables:
                 self._save_tables(title, tables)
             
             # 添加链接到队列
+            new_items = []
             if depth < self.max_depth:
-                for link in links:
-                    # 构建完整URL
-                    full_link = urljoin(url, link)
-                    # 只处理同一域名下的链接
-                    if self.domain in full_link and full_link not in self.visited_urls:
-                        self.url_queue.append((full_link, depth + 1))
+                # _get_links已返回同一域名下的完整URL；去重键在锁外计算
+                candidates = [(link, _url_key(link)) for link in links]
+                
+                # 只将未入队过的链接加入队列
+                with self._lock:
+                    for full_link, link_key in candidates:
+                        if link_key not in self.enqueued_urls:
+                            self.enqueued_urls.add(link_key)
+                            self.url_queue.append((full_link, depth + 1))
+                            new_items.append((full_link, link_key, depth + 1))
+            
+            # 记录新入队的链接，并标记页面处理完成，续爬时不再重新抓取
+            self._record_page(key, new_items)
             
             # 添加日志
             log_msg = f"已爬取: {title} ({url})"
@@ -290,15 +655,18 @@ class SimpleWikiFetcher:
             
         except Exception as e:
             logging.error(f"处理URL时发生错误: {url}, {str(e)}", exc_info=True)
-            progress['error_count'] += 1
+            _incr_progress('error_count')
     
     def _fetch_url(self, url):
-        """获取URL内容"""
+        """获取URL内容
+        
+        返回(原始字节, 响应头中声明的字符集)，解析时再据此和BOM、<meta>声明确定编码
+        """
         for retry in range(self.max_retries):
             try:
                 response = self.session.get(url, timeout=30)
                 response.raise_for_status()
-                return response.text
+                return response.content, _header_charset(response.headers)
             except Exception as e:
                 logging.warning(f"获取URL失败: {url}, 重试 {retry+1}/{self.max_retries}, 错误: {str(e)}")
                 time.sleep(1)  # 等待1秒后重试
@@ -313,7 +681,7 @@ class SimpleWikiFetcher:
         if title_tag and title_tag.text:
             title = title_tag.text.strip()
             # 移除网站名称后缀
-            title = re.sub(r'\s*[-|]\s*.*?$', '', title)
+            title = _TITLE_SUFFIX_RE.sub('', title)
             return title
         
         # 尝试从<h1>标签获取
@@ -321,6 +689,27 @@ class SimpleWikiFetcher:
         if h1_tag and h1_tag.text:
             return h1_tag.text.strip()
         
+        return self._title_from_url(url)
+    
+    def _get_title_tree(self, tree, url):
+        """从lxml元素树获取页面标题"""
+        # 尝试从<title>标签获取
+        title = (tree.findtext('.//title') or '').strip()
+        if title:
+            # 移除网站名称后缀
+            return _TITLE_SUFFIX_RE.sub('', title)
+        
+        # 尝试从<h1>标签获取
+        h1_tag = tree.find('.//h1')
+        if h1_tag is not None:
+            h1_text = h1_tag.text_content().strip()
+            if h1_text:
+                return h1_text
+        
+        return self._title_from_url(url)
+    
+    def _title_from_url(self, url):
+        """根据URL生成页面标题"""
         # 使用URL的最后部分作为标题
         parsed_url = urlparse(url)
         path_parts = parsed_url.path.split('/')
@@ -330,31 +719,24 @@ class SimpleWikiFetcher:
         # 使用域名作为标题
         return parsed_url.netloc
     
+    def _find_main_content_tree(self, tree):
+        """在lxml元素树中查找主要内容区域"""
+        for xpath in _CONTENT_XPATHS:
+            matches = xpath(tree)
+            if matches:
+                return matches[0]
+        
+        # 如果没有找到主要内容区域，使用<body>
+        body = tree.find('body')
+        return body if body is not None else tree
+    
     def _get_content(self, soup):
         """获取页面内容"""
         # 尝试找到主要内容区域
         main_content = None
         
-        # 常见的内容容器ID和类名
-        content_selectors = [
-            '#mw-content-text',  # MediaWiki
-            '#bodyContent',      # MediaWiki
-            '.mw-parser-output', # MediaWiki
-            'article',           # 常见文章标签
-            '.content',          # 常见内容类
-            '#content',          # 常见内容ID
-            'main',              # HTML5主要内容标签
-        ]
-        
-        # 尝试找到主要内容区域
-        for selector in content_selectors:
-            if selector.startswith('#'):
-                element = soup.find(id=selector[1:])
-            elif selector.startswith('.'):
-                element = soup.find(class_=selector[1:])
-            else:
-                element = soup.find(selector)
-            
+        for name, attrs in _CONTENT_FIND_ARGS:
+            element = soup.find(name, attrs)
             if element:
                 main_content = element
                 break
@@ -363,39 +745,41 @@ class SimpleWikiFetcher:
         if not main_content:
             main_content = soup.find('body') or soup
         
-        # 提取文本内容
-        content = ""
+        # 按文档顺序单次遍历，提取标题、段落和列表
+        parts = []
+        visited_lists = set()
         
-        # 处理标题
-        for i in range(1, 7):
-            for heading in main_content.find_all(f'h{i}'):
-                heading_text = heading.get_text().strip()
+        for element in main_content.descendants:
+            if not isinstance(element, Tag):
+                continue
+            name = element.name
+            
+            level = _HEADING_LEVELS.get(name)
+            if level:
+                # 根据标题级别添加#
+                heading_text = element.get_text().strip()
                 if heading_text:
-                    # 根据标题级别添加#
-                    content += f"{'#' * i} {heading_text}\n\n"
-        
-        # 处理段落
-        for p in main_content.find_all('p'):
-            p_text = p.get_text().strip()
-            if p_text:
-                content += f"{p_text}\n\n"
-        
-        # 处理列表
-        for ul in main_content.find_all('ul'):
-            for li in ul.find_all('li'):
-                li_text = li.get_text().strip()
-                if li_text:
-                    content += f"* {li_text}\n"
-            content += "\n"
-        
-        for ol in main_content.find_all('ol'):
-            for i, li in enumerate(ol.find_all('li')):
-                li_text = li.get_text().strip()
-                if li_text:
-                    content += f"{i+1}. {li_text}\n"
-            content += "\n"
-        
-        return content
+                    parts.append(f"{'#' * level} {heading_text}\n\n")
+            elif name == 'p':
+                p_text = element.get_text().strip()
+                if p_text:
+                    parts.append(f"{p_text}\n\n")
+            elif name in ('ul', 'ol'):
+                # 嵌套列表已随外层列表输出，跳过
+                if id(element) in visited_lists:
+                    continue
+                for i, li in enumerate(element.find_all('li')):
+                    li_text = li.get_text().strip()
+                    if li_text:
+                        if name == 'ul':
+                            parts.append(f"* {li_text}\n")
+                        else:
+                            parts.append(f"{i+1}. {li_text}\n")
+                parts.append("\n")
+                for nested in element.find_all(('ul', 'ol')):
+                    visited_lists.add(id(nested))
+        
+        return "".join(parts)
     
     def _get_links(self, soup, base_url):
         """获取页面链接"""
@@ -413,7 +797,7 @@ class SimpleWikiFetcher:
             full_url = urljoin(base_url, href)
             
             # 只保留同一域名下的链接
-            if self.domain in full_url:
+            if _netloc_of(full_url) == self._netloc:
                 links.append(full_url)
         
         return links
@@ -434,11 +818,71 @@ class SimpleWikiFetcher:
             full_url = urljoin(base_url, src)
             
             # 只保留图片URL
-            if re.search(r'\.(jpg|jpeg|png|gif|webp|svg)(\?.*)?$', full_url, re.I):
+            if _IMG_EXT_RE.search(full_url):
                 images.append(full_url)
         
         return images
     
+    def _parse_tree(self, html_content, base_url, header_encoding=None):
+        """解析页面，返回(元素树, 标题, 链接, 图片)
+        
+        使用lxml的HTMLPullParser，在构建元素树的同一遍中收集标题、链接和图片；
+        <head>、<script>和<style>解析后立即清空，不再占用内存
+        """
+        parser = etree.HTMLPullParser(events=('end',), tag=_STREAM_TAGS,
+                                      encoding=_sniff_encoding(html_content, header_encoding))
+        parser.set_element_class_lookup(lxml.html.HtmlElementClassLookup())
+        
+        title = ''
+        links = []
+        images = []
+        
+        def handle_events():
+            nonlocal title
+            for _, element in parser.read_events():
+                tag = element.tag
+                if tag == 'a':
+                    href = element.get('href')
+                    
+                    # 忽略空链接、锚点链接和JavaScript链接
+                    if not href or href.startswith('#') or href.startswith('javascript:'):
+                        continue
+                    
+                    # 只保留同一域名下的链接
+                    full_url = urljoin(base_url, href)
+                    if _netloc_of(full_url) == self._netloc:
+                        links.append(full_url)
+                elif tag == 'img':
+                    src = element.get('src')
+                    
+                    # 忽略数据URI和空链接
+                    if not src or src.startswith('data:'):
+                        continue
+                    
+                    # 只保留图片URL
+                    full_url = urljoin(base_url, src)
+                    if _IMG_EXT_RE.search(full_url):
+                        images.append(full_url)
+                elif tag == 'title':
+                    if not title:
+                        title = (element.text or '').strip()
+                else:
+                    # <head>、<script>和<style>不参与后续提取
+                    element.clear(keep_tail=True)
+        
+        # 页面已完整读入内存，一次送入解析器，避免切片复制
+        parser.feed(html_content)
+        tree = parser.close()
+        handle_events()
+        
+        if title:
+            # 移除网站名称后缀
+            title = _TITLE_SUFFIX_RE.sub('', title)
+        else:
+            title = self._get_title_tree(tree, base_url)
+        
+        return tree, title, links, images
+    
     def _get_tables(self, soup):
         """获取页面表格"""
         tables = []
@@ -468,41 +912,84 @@ class SimpleWikiFetcher:
             
             # 如果表格有数据，转换为CSV格式
             if table_data:
-                csv_data = ""
-                for row in table_data:
-                    # 处理CSV中的特殊字符
-                    escaped_row = []
-                    for cell in row:
-                        if '"' in cell:
-                            cell = cell.replace('"', '""')
-                        if ',' in cell or '"' in cell or '\n' in cell:
-                            cell = f'"{cell}"'
-                        escaped_row.append(cell)
-                    csv_data += ",".join(escaped_row) + "\n"
-                
-                tables.append(csv_data)
+                tables.append(self._rows_to_csv(table_data))
+        
+        return tables
+    
+    def _get_tables_tree(self, tree):
+        """从lxml元素树获取页面表格"""
+        tables = []
+        
+        for table in tree.iter('table'):
+            # 提取表格数据
+            table_data = []
+            
+            # 处理表头
+            thead = table.find('.//thead')
+            if thead is not None:
+                header_row = [th.text_content().strip() for th in thead.iter('th', 'td')]
+                if header_row:
+                    table_data.append(header_row)
+            
+            # 处理表体
+            tbody = table.find('.//tbody')
+            if tbody is None:
+                tbody = table
+            for tr in tbody.iter('tr'):
+                row = [td.text_content().strip() for td in tr.iter('td', 'th')]
+                if row:
+                    table_data.append(row)
+            
+            # 如果表格有数据，转换为CSV格式
+            if table_data:
+                tables.append(self._rows_to_csv(table_data))
         
         return tables
     
-    def _save_page(self, title, content, url, html_content):
-        """保存页面内容"""
+    def _rows_to_csv(self, table_data):
+        """将表格行数据转换为CSV文本"""
+        buf = io.StringIO()
+        csv.writer(buf, quoting=csv.QUOTE_MINIMAL, lineterminator='\n').writerows(table_data)
+        return buf.getvalue()
+    
+    def _save_page(self, title, content, url, html_content, image_count=0, table_count=0):
+        """保存页面内容
+        
+        同时在Markdown文件旁写入同名的.json元数据文件，整理内容时直接读取其中的分类结果，
+        不必重新读取和扫描页面全文
+        """
         try:
             # 创建文件名
             file_name = self._sanitize_filename(title)
             if not file_name:
-                file_name = hashlib.md5(url.encode()).hexdigest()
+                file_name = _name_hash(url)
             
             # 保存Markdown内容
+            markdown = f"# {title}\n\nURL: {url}\n\n{content}".encode('utf-8')
             md_path = os.path.join(self.output_dir, 'pages', f"{file_name}.md")
-            with open(md_path, 'w', encoding='utf-8') as f:
-                f.write(f"# {title}\n\n")
-                f.write(f"URL: {url}\n\n")
-                f.write(content)
+            with open(md_path, 'wb') as f:
+                f.write(markdown)
+            
+            # 保存页面元数据
+            headings = [line.lstrip('#').strip() for line in content.split('\n')
+                        if line.startswith('# ') or line.startswith('## ')]
+            meta = {
+                'url': url,
+                'title': title,
+                'headings': headings,
+                'table_count': table_count,
+                'image_count': image_count,
+                'size': len(markdown),
+                'category_hint': _classify_page(markdown),
+            }
+            meta_path = os.path.join(self.output_dir, 'pages', f"{file_name}.json")
+            with open(meta_path, 'w', encoding='utf-8') as f:
+                f.write(json.dumps(meta, ensure_ascii=False))
             
             # 保存原始HTML
             if self.save_html:
                 html_path = os.path.join(self.output_dir, 'html', f"{file_name}.html")
-                with open(html_path, 'w', encoding='utf-8') as f:
+                with open(html_path, 'wb') as f:
                     f.write(html_content)
             
             logging.debug(f"已保存页面: {url} -> {file_name}")
@@ -510,21 +997,34 @@ class SimpleWikiFetcher:
         except Exception as e:
             logging.error(f"保存页面时出错: {url}, 错误: {str(e)}")
     
+    def _image_path(self, img_url):
+        """获取图片的本地保存路径"""
+        # 获取图片文件名
+        parsed_url = urlparse(img_url)
+        file_name = os.path.basename(parsed_url.path)
+        
+        # 如果文件名为空或无效，使用URL的MD5哈希值
+        if not file_name or not _IMG_FILE_RE.search(file_name):
+            file_name = f"{_name_hash(img_url)}.jpg"
+        
+        # 图片保存路径
+        return os.path.join(self.output_dir, 'images', file_name)
+    
+    def _download_images(self, img_urls):
+        """下载页面中的所有图片
+        
+        逐个下载，复用抓取页面的会话连接；多个页面的图片由各抓取线程并行下载
+        """
+        for img_url in img_urls:
+            self._download_image(img_url)
+    
     def _download_image(self, img_url):
         """下载图片"""
         global progress
         
         try:
-            # 获取图片文件名
-            parsed_url = urlparse(img_url)
-            file_name = os.path.basename(parsed_url.path)
-            
-            # 如果文件名为空或无效，使用URL的MD5哈希值
-            if not file_name or not re.search(r'\.(jpg|jpeg|png|gif|webp|svg)$', file_name, re.I):
-                file_name = f"{hashlib.md5(img_url.encode()).hexdigest()}.jpg"
-            
-            # 图片保存路径
-            img_path = os.path.join(self.output_dir, 'images', file_name)
+            img_path = self._image_path(img_url)
+            file_name = os.path.basename(img_path)
             
             # 如果图片已存在，跳过下载
             if os.path.exists(img_path):
@@ -538,11 +1038,11 @@ class SimpleWikiFetcher:
                     
                     # 保存图片
                     with open(img_path, 'wb') as f:
-                        for chunk in response.iter_content(chunk_size=8192):
+                        for chunk in response.iter_content(chunk_size=1 << 16):
                             f.write(chunk)
                     
                     # 更新图片计数
-                    progress['images_count'] += 1
+                    _incr_progress('images_count')
                     
                     logging.debug(f"已下载图片: {img_url} -> {file_name}")
                     return
@@ -562,7 +1062,7 @@ class SimpleWikiFetcher:
             # 创建文件名
             file_name = self._sanitize_filename(title)
             if not file_name:
-                file_name = hashlib.md5(title.encode()).hexdigest()
+                file_name = _name_hash(title)
             
             # 保存表格
             for i, table in enumerate(tables):
@@ -578,9 +1078,9 @@ class SimpleWikiFetcher:
     def _sanitize_filename(self, name):
         """清理文件名"""
         # 移除非法字符
-        name = re.sub(r'[\\/*?:"<>|]', '', name)
+        name = _FN_BAD_RE.sub('', name)
         # 将空格替换为下划线
-        name = re.sub(r'\s+', '_', name)
+        name = _FN_WS_RE.sub('_', name)
         # 限制长度
         if len(name) > 100:
             name = name[:100]
@@ -620,13 +1120,30 @@ class FetcherForm(FlaskForm):
     ], default='INFO', description='日志记录的详细程度')
     max_retries = IntegerField('最大重试次数', validators=[NumberRange(min=1, max=10)], default=3,
                               description='请求失败时的最大重试次数')
+    resume = BooleanField('断点续爬', default=False,
+                         description='从上次中断的位置继续抓取，已完成的页面不再重新获取（需要安装lmdb）')
     submit = SubmitField('开始抓取')
 
+# 表单字段名称，用于从默认配置中筛选需要填充的项
+_FORM_FIELD_NAMES = frozenset(name for name, value in vars(FetcherForm).items() if isinstance(value, UnboundField))
+
 # 从环境变量或配置文件加载默认值
 def load_default_config():
-    """加载默认配置"""
+    """加载默认配置
+    
+    解析结果按.env文件的修改时间缓存，文件未变化时不再重复读取；返回副本，调用方可以修改
+    """
+    try:
+        mtime = os.path.getmtime(ENV_PATH)
+    except OSError:
+        mtime = None
+    return dict(_load_default_config_cached(mtime))
+
+@functools.lru_cache(maxsize=8)
+def _load_default_config_cached(mtime):
+    """读取并解析.env文件，mtime仅用作缓存键"""
     # 尝试从.env文件加载配置
-    env_path = os.path.join(root_dir, '.env')
+    env_path = ENV_PATH
     config = {}
     
     if os.path.exists(env_path):
@@ -674,6 +1191,8 @@ def load_default_config():
                             config['log_level'] = value
                         elif key == 'max_retries':
                             config['max_retries'] = int(value)
+                        elif key == 'resume':
+                            config['resume'] = value if isinstance(value, bool) else value.lower() == 'true'
                     except ValueError:
                         continue
             
@@ -705,6 +1224,8 @@ def load_default_config():
         config['log_level'] = 'INFO'
     if 'max_retries' not in config:
         config['max_retries'] = 3
+    if 'resume' not in config:
+        config['resume'] = False
     
     return config
 
@@ -717,15 +1238,266 @@ web_log_handler.setLevel(logging.INFO)
 root_logger = logging.getLogger()
 root_logger.addHandler(web_log_handler)
 
+def _build_keyword_classifier(page_keywords):
+    """根据分类关键词构建页面分类函数
+    
+    返回的函数接收UTF-8编码的页面内容，返回第一个（按page_keywords顺序）命中关键词的分类，
+    都未命中时返回None。直接在字节串上查找预先编码的关键词，省去解码整个文件。
+    """
+    # 关键词中的字母都是ASCII，bytes.lower()即可完成大小写折叠
+    keyword_bytes = [(category, [keyword.lower().encode('utf-8') for keyword in keywords])
+                     for category, keywords in page_keywords.items()]
+    
+    def classify(data):
+        data = data.lower()
+        for category, keywords in keyword_bytes:
+            if any(keyword in data for keyword in keywords):
+                return category
+        return None
+    return classify
+
+# 关键词映射，用于页面分类
+PAGE_KEYWORDS = {
+    'items': ['item', 'weapon', 'armor', 'tool', 'potion', 'equipment', '物品', '武器', '装备', '道具'],
+    'characters': ['character', 'npc', 'enemy', 'boss', 'monster', '角色', '敌人', '怪物', 'villager'],
+    'locations': ['location', 'place', 'map', 'area', 'region', 'biome', '地点', '区域', '地图'],
+    'mechanics': ['mechanic', 'system', 'feature', 'gameplay', 'crafting', 'skill', '系统', '技能', '玩法']
+}
+
+_classify_page = _build_keyword_classifier(PAGE_KEYWORDS)
+
+def _load_page_meta(md_path):
+    """读取页面旁的.json元数据文件，不存在或无法解析时返回None"""
+    meta_path = os.path.splitext(md_path)[0] + '.json'
+    try:
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _copy_organized_file(file_path, dest_path):
+    """将单个文件放入整理目录
+    
+    优先创建硬链接，不占用额外磁盘空间；跨文件系统时退回到复制文件内容，
+    文件系统不支持硬链接时使用copy2
+    """
+    file = os.path.basename(file_path)
+    try:
+        # 重新整理时覆盖已有文件
+        if os.path.lexists(dest_path):
+            os.remove(dest_path)
+        try:
+            os.link(file_path, dest_path)
+        except OSError as e:
+            if e.errno == errno.EXDEV:
+                shutil.copyfile(file_path, dest_path)
+            else:
+                shutil.copy2(file_path, dest_path)
+        logging.info(f"已整理文件: {file} -> {dest_path}")
+    except Exception as e:
+        logging.error(f"整理文件时出错: {file}, 错误: {str(e)}")
+
 # 内容整理功能
+def _list_sorted(path):
+    """用os.scandir单次读取目录，返回排序后的文件名列表"""
+    with os.scandir(path) as it:
+        return sorted(entry.name for entry in it)
+
+def _has_files(path):
+    """判断目录树中是否存在文件，找到第一个文件即返回"""
+    pending = [path]
+    while pending:
+        with os.scandir(pending.pop()) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    pending.append(entry.path)
+                else:
+                    return True
+    return False
+
+# 整理结果索引页的样式
+_INDEX_CSS = """        body { font-family: 'Microsoft YaHei', Arial, sans-serif; margin: 0; padding: 20px; background-color: #f5f5f5; color: #333; }
+        h1, h2, h3 { color: #2c3e50; }
+        .container { max-width: 1200px; margin: 0 auto; }
+        .category { margin-bottom: 30px; background-color: white; padding: 20px; border-radius: 5px; box-shadow: 0 2px 5px rgba(0,0,0,0.1); }
+        .subcategory { margin: 15px 0; padding: 15px; background-color: #f9f9f9; border-radius: 5px; }
+        .category h2 { color: #2c3e50; border-bottom: 1px solid #eee; padding-bottom: 10px; }
+        .subcategory h3 { color: #3498db; margin-top: 0; }
+        .file-list { list-style-type: none; padding: 0; }
+        .file-list li { padding: 8px 0; border-bottom: 1px solid #eee; }
+        .file-list li:last-child { border-bottom: none; }
+        .file-list a { color: #3498db; text-decoration: none; }
+        .file-list a:hover { text-decoration: underline; }
+        .stats { background-color: #2c3e50; color: white; padding: 20px; border-radius: 5px; margin-bottom: 20px; }
+        .stats h2 { margin-top: 0; color: #3498db; }
+        .stat-item { margin-bottom: 10px; }
+        .stat-value { font-size: 1.2em; font-weight: bold; color: #3498db; }
+        .stat-grid { display: grid; grid-template-columns: repeat(auto-fill, minmax(200px, 1fr)); gap: 15px; }
+        .stat-card { background-color: rgba(255,255,255,0.1); padding: 15px; border-radius: 5px; }
+        .stat-card h4 { margin-top: 0; color: #3498db; }
+        .search-box { margin-bottom: 20px; padding: 15px; background-color: white; border-radius: 5px; box-shadow: 0 2px 5px rgba(0,0,0,0.1); }
+        .search-box input { width: 100%; padding: 10px; border: 1px solid #ddd; border-radius: 4px; }
+        .hidden { display: none; }
+        @media (max-width: 768px) {
+            .stat-grid { grid-template-columns: 1fr 1fr; }
+        }
+        @media (max-width: 480px) {
+            .stat-grid { grid-template-columns: 1fr; }
+        }"""
+
+# 整理结果索引页的渲染和搜索脚本：文件清单以JSON嵌入页面，在浏览器中生成列表
+_INDEX_SCRIPT = """        const MANIFEST = JSON.parse(document.getElementById('manifest').textContent);
+        // 所有文件条目：{element, name}，name为预先转为小写的文件名
+        const ITEMS = [];
+        // 所有子分类：{element, items}
+        const SUBCATEGORIES = [];
+        let searchTimer = null;
+        
+        function createElement(tag, className, text) {
+            const element = document.createElement(tag);
+            if (className) element.className = className;
+            if (text !== undefined) element.textContent = text;
+            return element;
+        }
+        
+        // 先在DocumentFragment中生成全部列表项，再一次性插入文档
+        function renderFileList(prefix, files, items) {
+            const list = createElement('ul', 'file-list');
+            const fragment = document.createDocumentFragment();
+            files.forEach(file => {
+                const li = document.createElement('li');
+                const link = createElement('a', null, file);
+                link.setAttribute('href', prefix + file);
+                link.target = '_blank';
+                li.appendChild(link);
+                fragment.appendChild(li);
+                items.push({element: li, name: file.toLowerCase()});
+            });
+            list.appendChild(fragment);
+            return list;
+        }
+        
+        function render() {
+            Object.keys(MANIFEST.stats).forEach(key => {
+                const element = document.getElementById('stat-' + key);
+                if (element) element.textContent = MANIFEST.stats[key];
+            });
+            document.getElementById('stat-time').textContent = MANIFEST.time;
+            
+            const fragment = document.createDocumentFragment();
+            MANIFEST.sections.forEach(section => {
+                if (!section.subs && !section.files.length) return;
+                
+                const category = createElement('div', 'category');
+                category.appendChild(createElement('h2', null, `${section.label} (${section.count})`));
+                if (section.subs) {
+                    section.subs.forEach(sub => {
+                        const subcategory = createElement('div', 'subcategory');
+                        const items = [];
+                        subcategory.appendChild(createElement('h3', null, `${sub.title} (${sub.files.length})`));
+                        subcategory.appendChild(renderFileList(sub.prefix, sub.files, items));
+                        category.appendChild(subcategory);
+                        SUBCATEGORIES.push({element: subcategory, items: items});
+                        ITEMS.push(...items);
+                    });
+                } else {
+                    category.appendChild(renderFileList(section.prefix, section.files, ITEMS));
+                }
+                fragment.appendChild(category);
+            });
+            document.getElementById('sections').appendChild(fragment);
+        }
+        
+        // 输入停止100毫秒后再搜索，避免每次按键都遍历全部文件
+        function scheduleSearch() {
+            clearTimeout(searchTimer);
+            searchTimer = setTimeout(runSearch, 100);
+        }
+        
+        // 只在内存中的文件名数组上匹配，不需要查询DOM
+        function runSearch() {
+            const filter = document.getElementById('search-input').value.toLowerCase();
+            ITEMS.forEach(item => { item.match = item.name.indexOf(filter) !== -1; });
+            
+            // 在同一帧内统一切换hidden类，减少重排
+            requestAnimationFrame(() => {
+                ITEMS.forEach(item => item.element.classList.toggle('hidden', !item.match));
+                
+                // 隐藏空的子分类
+                SUBCATEGORIES.forEach(sub => sub.element.classList.toggle('hidden', !sub.items.some(item => item.match)));
+            });
+        }
+        
+        render();"""
+
+# 整理结果索引页；页面本身是固定的，只在其中嵌入文件清单，列表由脚本在浏览器中生成
+_INDEX_HEAD = """<!DOCTYPE html>
+<html>
+<head>
+    <meta charset="utf-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>Wiki内容索引</title>
+    <style>
+""" + _INDEX_CSS + """
+    </style>
+</head>
+<body>
+    <div class="container">
+        <h1>Wiki内容索引</h1>
+        
+        <div class="search-box">
+            <input type="text" id="search-input" placeholder="搜索文件..." oninput="scheduleSearch()">
+        </div>
+        
+        <div class="stats">
+            <h2>统计信息</h2>
+            <div class="stat-grid">
+                <div class="stat-card">
+                    <h4>总文件数</h4>
+                    <div class="stat-value" id="stat-total_files"></div>
+                </div>
+                <div class="stat-card">
+                    <h4>页面数量</h4>
+                    <div class="stat-value" id="stat-pages"></div>
+                </div>
+                <div class="stat-card">
+                    <h4>图片数量</h4>
+                    <div class="stat-value" id="stat-images"></div>
+                </div>
+                <div class="stat-card">
+                    <h4>表格数量</h4>
+                    <div class="stat-value" id="stat-tables"></div>
+                </div>
+                <div class="stat-card">
+                    <h4>其他文件</h4>
+                    <div class="stat-value" id="stat-other"></div>
+                </div>
+                <div class="stat-card">
+                    <h4>整理时间</h4>
+                    <div class="stat-value" id="stat-time"></div>
+                </div>
+            </div>
+        </div>
+        
+        <div id="sections"></div>
+    </div>
+
+    <script type="application/json" id="manifest">"""
+
+_INDEX_TAIL = """</script>
+    <script>
+""" + _INDEX_SCRIPT + """
+    </script>
+</body>
+</html>"""
+
 def organize_wiki_content(output_dir):
     """整理Wiki内容，按类型分类并优化结构"""
-    global progress, is_organizing
+    global progress
     
     try:
-        is_organizing = True
         logging.info(f"开始整理Wiki内容: {output_dir}")
-        progress['status'] = '正在整理'
+        _set_progress('status', '正在整理')
         
         # 创建整理后的目录结构
         organized_dir = os.path.join(output_dir, 'organized')
@@ -778,24 +1550,30 @@ def organize_wiki_content(output_dir):
             }
         }
         
-        # 关键词映射，用于页面分类
-        page_keywords = {
-            'items': ['item', 'weapon', 'armor', 'tool', 'potion', 'equipment', '物品', '武器', '装备', '道具'],
-            'characters': ['character', 'npc', 'enemy', 'boss', 'monster', '角色', '敌人', '怪物', 'villager'],
-            'locations': ['location', 'place', 'map', 'area', 'region', 'biome', '地点', '区域', '地图'],
-            'mechanics': ['mechanic', 'system', 'feature', 'gameplay', 'crafting', 'skill', '系统', '技能', '玩法']
-        }
-        
-        # 遍历原始目录
+        # 第一阶段：遍历原始目录并确定每个文件的目标位置
+        copy_jobs = []
         for root, dirs, files in os.walk(output_dir):
             # 跳过已整理的目录
             if 'organized' in root:
                 continue
             
+            # 跳过抓取状态数据库
+            if '.state' in dirs:
+                dirs.remove('.state')
+            
+            # 本目录中页面文件的文件名（不含扩展名），用于识别页面元数据文件
+            page_stems = {file[:-3] for file in files if file.endswith('.md')}
+            
             for file in files:
                 file_path = os.path.join(root, file)
-                file_ext = os.path.splitext(file)[1].lower()
-                file_name = os.path.splitext(file)[0].lower()
+                stem, file_ext = os.path.splitext(file)
+                file_ext = file_ext.lower()
+                file_name = stem.lower()
+                
+                # 页面元数据文件随页面一起使用，不单独整理
+                if file_ext == '.json' and stem in page_stems:
+                    continue
+                
                 file_size = os.path.getsize(file_path)
                 
                 stats['total_files'] += 1
@@ -823,21 +1601,21 @@ def organize_wiki_content(output_dir):
                     # 页面文件
                     stats['pages'] += 1
                     
-                    # 读取文件内容进行分类
+                    # 优先使用抓取时写入的元数据，没有元数据时再读取文件内容进行分类
                     try:
-                        with open(file_path, 'r', encoding='utf-8') as f:
-                            content = f.read().lower()
-                        
-                        # 根据内容关键词分类
-                        category_found = False
-                        for category, keywords in page_keywords.items():
-                            if any(keyword in content for keyword in keywords):
-                                dest_dir = subcategories['pages'][category]
-                                stats['subcategories']['pages'][category] += 1
-                                category_found = True
-                                break
-                        
-                        if not category_found:
+                        meta = _load_page_meta(file_path)
+                        if meta is not None:
+                            category = meta.get('category_hint')
+                        else:
+                            with open(file_path, 'rb') as f:
+                                content = f.read()
+                            
+                            # 根据内容关键词分类
+                            category = _classify_page(content)
+                        if category:
+                            dest_dir = subcategories['pages'][category]
+                            stats['subcategories']['pages'][category] += 1
+                        else:
                             # 检查是否是主页
                             if 'main' in file_name or 'index' in file_name or 'home' in file_name:
                                 dest_dir = subcategories['pages']['main']
@@ -858,222 +1636,68 @@ def organize_wiki_content(output_dir):
                     dest_dir = categories['other']
                     stats['other'] += 1
                 
-                # 复制文件到目标目录
-                dest_path = os.path.join(dest_dir, file)
-                try:
-                    shutil.copy2(file_path, dest_path)
-                    logging.info(f"已整理文件: {file} -> {dest_path}")
-                except Exception as e:
-                    logging.error(f"整理文件时出错: {file}, 错误: {str(e)}")
+                copy_jobs.append((file_path, os.path.join(dest_dir, file)))
         
-        # 创建索引文件
-        index_path = os.path.join(organized_dir, 'index.html')
-        with open(index_path, 'w', encoding='utf-8') as f:
-            f.write(f"""<!DOCTYPE html>
-<html>
-<head>
-    <meta charset="utf-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>Wiki内容索引</title>
-    <style>
-        body {{ font-family: 'Microsoft YaHei', Arial, sans-serif; margin: 0; padding: 20px; background-color: #f5f5f5; color: #333; }}
-        h1, h2, h3 {{ color: #2c3e50; }}
-        .container {{ max-width: 1200px; margin: 0 auto; }}
-        .category {{ margin-bottom: 30px; background-color: white; padding: 20px; border-radius: 5px; box-shadow: 0 2px 5px rgba(0,0,0,0.1); }}
-        .subcategory {{ margin: 15px 0; padding: 15px; background-color: #f9f9f9; border-radius: 5px; }}
-        .category h2 {{ color: #2c3e50; border-bottom: 1px solid #eee; padding-bottom: 10px; }}
-        .subcategory h3 {{ color: #3498db; margin-top: 0; }}
-        .file-list {{ list-style-type: none; padding: 0; }}
-        .file-list li {{ padding: 8px 0; border-bottom: 1px solid #eee; }}
-        .file-list li:last-child {{ border-bottom: none; }}
-        .file-list a {{ color: #3498db; text-decoration: none; }}
-        .file-list a:hover {{ text-decoration: underline; }}
-        .stats {{ background-color: #2c3e50; color: white; padding: 20px; border-radius: 5px; margin-bottom: 20px; }}
-        .stats h2 {{ margin-top: 0; color: #3498db; }}
-        .stat-item {{ margin-bottom: 10px; }}
-        .stat-value {{ font-size: 1.2em; font-weight: bold; color: #3498db; }}
-        .stat-grid {{ display: grid; grid-template-columns: repeat(auto-fill, minmax(200px, 1fr)); gap: 15px; }}
-        .stat-card {{ background-color: rgba(255,255,255,0.1); padding: 15px; border-radius: 5px; }}
-        .stat-card h4 {{ margin-top: 0; color: #3498db; }}
-        .search-box {{ margin-bottom: 20px; padding: 15px; background-color: white; border-radius: 5px; box-shadow: 0 2px 5px rgba(0,0,0,0.1); }}
-        .search-box input {{ width: 100%; padding: 10px; border: 1px solid #ddd; border-radius: 4px; }}
-        @media (max-width: 768px) {{
-            .stat-grid {{ grid-template-columns: 1fr 1fr; }}
-        }}
-        @media (max-width: 480px) {{
-            .stat-grid {{ grid-template-columns: 1fr; }}
-        }}
-    </style>
-</head>
-<body>
-    <div class="container">
-        <h1>Wiki内容索引</h1>
+        # 第二阶段：并行将文件链接或复制到目标目录
+        with ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 1)) as executor:
+            list(executor.map(lambda job: _copy_organized_file(*job), copy_jobs))
         
-        <div class="search-box">
-            <input type="text" id="search-input" placeholder="搜索文件..." onkeyup="searchFiles()">
-        </div>
+        # 索引页中各分类的顺序：(标题, 统计键, 子分类目录字典或分类目录)
+        section_specs = [
+            ('页面', 'pages', subcategories['pages']),
+            ('图片', 'images', subcategories['images']),
+            ('表格', 'tables', categories['tables']),
+            ('其他文件', 'other', categories['other']),
+        ]
         
-        <div class="stats">
-            <h2>统计信息</h2>
-            <div class="stat-grid">
-                <div class="stat-card">
-                    <h4>总文件数</h4>
-                    <div class="stat-value">{stats['total_files']}</div>
-                </div>
-                <div class="stat-card">
-                    <h4>页面数量</h4>
-                    <div class="stat-value">{stats['pages']}</div>
-                </div>
-                <div class="stat-card">
-                    <h4>图片数量</h4>
-                    <div class="stat-value">{stats['images']}</div>
-                </div>
-                <div class="stat-card">
-                    <h4>表格数量</h4>
-                    <div class="stat-value">{stats['tables']}</div>
-                </div>
-                <div class="stat-card">
-                    <h4>其他文件</h4>
-                    <div class="stat-value">{stats['other']}</div>
-                </div>
-                <div class="stat-card">
-                    <h4>整理时间</h4>
-                    <div class="stat-value">{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}</div>
-                </div>
-            </div>
-        </div>
-""")
-            
-            # 页面分类
-            f.write(f"""
-        <div class="category">
-            <h2>页面 ({stats['pages']})</h2>
-""")
-            
-            for subcategory, subcategory_dir in subcategories['pages'].items():
-                subcategory_files = os.listdir(subcategory_dir)
-                if subcategory_files:
-                    subcategory_title = os.path.basename(subcategory_dir)
-                    f.write(f"""
-            <div class="subcategory">
-                <h3>{subcategory_title} ({len(subcategory_files)})</h3>
-                <ul class="file-list">
-""")
-                    
-                    for file in sorted(subcategory_files):
-                        file_path = os.path.join('页面', subcategory_title, file)
-                        f.write(f'                    <li><a href="{file_path}" target="_blank">{file}</a></li>\n')
-                    
-                    f.write("""                </ul>
-            </div>
-""")
-            
-            f.write("""        </div>
-""")
-            
-            # 图片分类
-            f.write(f"""
-        <div class="category">
-            <h2>图片 ({stats['images']})</h2>
-""")
-            
-            for subcategory, subcategory_dir in subcategories['images'].items():
-                subcategory_files = os.listdir(subcategory_dir)
-                if subcategory_files:
-                    subcategory_title = os.path.basename(subcategory_dir)
-                    f.write(f"""
-            <div class="subcategory">
-                <h3>{subcategory_title} ({len(subcategory_files)})</h3>
-                <ul class="file-list">
-""")
-                    
-                    for file in sorted(subcategory_files):
-                        file_path = os.path.join('图片', subcategory_title, file)
-                        f.write(f'                    <li><a href="{file_path}" target="_blank">{file}</a></li>\n')
-                    
-                    f.write("""                </ul>
-            </div>
-""")
-            
-            f.write("""        </div>
-""")
-            
-            # 表格分类
-            table_files = os.listdir(categories['tables'])
-            if table_files:
-                f.write(f"""
-        <div class="category">
-            <h2>表格 ({stats['tables']})</h2>
-            <ul class="file-list">
-""")
-                
-                for file in sorted(table_files):
-                    file_path = os.path.join('表格', file)
-                    f.write(f'                <li><a href="{file_path}" target="_blank">{file}</a></li>\n')
-                
-                f.write("""            </ul>
-        </div>
-""")
-            
-            # 其他文件
-            other_files = os.listdir(categories['other'])
-            if other_files:
-                f.write(f"""
-        <div class="category">
-            <h2>其他文件 ({stats['other']})</h2>
-            <ul class="file-list">
-""")
-                
-                for file in sorted(other_files):
-                    file_path = os.path.join('其他', file)
-                    f.write(f'                <li><a href="{file_path}" target="_blank">{file}</a></li>\n')
-                
-                f.write("""            </ul>
-        </div>
-""")
-            
-            # 添加搜索功能
-            f.write("""
-    </div>
-    
-    <script>
-        function searchFiles() {
-            const input = document.getElementById('search-input');
-            const filter = input.value.toLowerCase();
-            const fileItems = document.querySelectorAll('.file-list li');
-            
-            fileItems.forEach(item => {
-                const text = item.textContent.toLowerCase();
-                if (text.includes(filter)) {
-                    item.style.display = '';
-                } else {
-                    item.style.display = 'none';
-                }
-            });
-            
-            // 隐藏空的子分类
-            const subcategories = document.querySelectorAll('.subcategory');
-            subcategories.forEach(subcategory => {
-                const visibleItems = subcategory.querySelectorAll('li[style="display: none;"]');
-                if (visibleItems.length === subcategory.querySelectorAll('li').length) {
-                    subcategory.style.display = 'none';
-                } else {
-                    subcategory.style.display = '';
-                }
-            });
+        # 并行读取所有目录的文件列表
+        list_dirs = []
+        for _, _, target in section_specs:
+            list_dirs.extend(target.values() if isinstance(target, dict) else (target,))
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            listings = dict(zip(list_dirs, executor.map(_list_sorted, list_dirs)))
+        
+        def link_prefix(path):
+            """目录相对于索引文件的链接前缀"""
+            return os.path.relpath(path, organized_dir).replace(os.sep, '/') + '/'
+        
+        # 文件清单：索引页只需要各目录的文件名，链接和列表由页面脚本生成
+        sections = []
+        for label, stat_key, target in section_specs:
+            section = {'label': label, 'count': stats[stat_key]}
+            if isinstance(target, dict):
+                section['subs'] = [
+                    {'title': os.path.basename(d), 'prefix': link_prefix(d), 'files': listings[d]}
+                    for d in target.values() if listings[d]
+                ]
+            else:
+                section['prefix'] = link_prefix(target)
+                section['files'] = listings[target]
+            sections.append(section)
+        
+        manifest = {
+            'stats': stats,
+            'time': datetime.now().strftime(_TS_FMT),
+            'sections': sections,
         }
-    </script>
-</body>
-</html>""")
+        manifest_json = json.dumps(manifest, ensure_ascii=False, separators=(',', ':'))
+        
+        # 清单嵌入索引页中，直接打开本地文件时也能显示（file://下无法fetch）；转义"<"以免提前结束script标签
+        index_html = (_INDEX_HEAD + manifest_json.replace('<', '\\u003c') + _INDEX_TAIL).encode('utf-8')
+        index_path = os.path.join(organized_dir, 'index.html')
+        with open(index_path, 'wb') as f:
+            f.write(index_html)
+        
+        # 同时保存gzip压缩版本，浏览器支持时直接发送压缩内容
+        with open(index_path + '.gz', 'wb') as f:
+            f.write(gzip.compress(index_html, compresslevel=6))
         
         logging.info(f"Wiki内容整理完成，索引文件已创建: {index_path}")
-        progress['status'] = '整理完成'
+        _set_progress('status', '整理完成')
         
     except Exception as e:
         logging.error(f"整理Wiki内容时出错: {str(e)}", exc_info=True)
-        progress['status'] = '整理出错'
-    finally:
-        is_organizing = False
+        _set_progress('status', '整理出错')
 
 # 路由定义
 @app.route('/', methods=['GET', 'POST'])
@@ -1084,19 +1708,17 @@ def index():
         # 如果表单验证通过，直接启动抓取任务
         return start_fetcher_internal(form)
     
-    # 加载默认配置
-    default_config = load_default_config()
-    
-    # 创建表单并填充默认值
-    form = FetcherForm()
-    if default_config:
-        for key, value in default_config.items():
-            if hasattr(form, key):
-                field = getattr(form, key)
-                if value is not None:
-                    field.data = value
+    # 首次打开页面时用默认配置填充表单；提交失败时保留用户输入和错误信息
+    if request.method == 'GET':
+        default_config = load_default_config()
+        for key in _FORM_FIELD_NAMES.intersection(default_config):
+            value = default_config[key]
+            if value is not None:
+                form[key].data = value
     
-    return render_template('index.html', form=form, progress=progress, is_running=is_running, is_organizing=is_organizing)
+    log_seq, log_messages = web_log_handler.snapshot()
+    return render_template('index.html', form=form, progress=progress, is_running=_is_running(), is_organizing=_is_organizing(),
+                           log_seq=log_seq, log_messages=log_messages)
 
 @app.route('/start', methods=['POST'])
 def start_fetcher():
@@ -1113,10 +1735,10 @@ def start_fetcher():
 
 def start_fetcher_internal(form):
     """内部函数，启动抓取任务"""
-    global fetcher_thread, is_running, progress
+    global _current_fetch, progress
     
     # 如果已经在运行，则返回错误
-    if is_running:
+    if _is_running():
         flash('任务已在运行中，请等待完成或停止当前任务', 'warning')
         return redirect(url_for('index'))
     
@@ -1132,7 +1754,8 @@ def start_fetcher_internal(form):
         'threads': form.threads.data,
         'save_html': form.save_html.data,
         'log_level': form.log_level.data,
-        'max_retries': form.max_retries.data
+        'max_retries': form.max_retries.data,
+        'resume': form.resume.data
     }
     
     # 如果输出目录为空，根据Wiki URL自动生成
@@ -1151,7 +1774,7 @@ def start_fetcher_internal(form):
                 if len(path_parts) > wiki_index + 1:
                     wiki_name = path_parts[wiki_index + 1]
         # 清理名称，只保留字母数字和下划线
-        wiki_name = re.sub(r'[^\w\-]', '_', wiki_name)
+        wiki_name = _WIKI_NAME_SANITIZE.sub('_', wiki_name)
         # 创建输出目录
         config['output_dir'] = os.path.join(root_dir, 'wiki_data', wiki_name)
         logging.info(f"自动创建输出目录: {config['output_dir']}")
@@ -1160,34 +1783,38 @@ def start_fetcher_internal(form):
         config['output_dir'] = os.path.join(root_dir, config['output_dir'])
         logging.info(f"转换为绝对路径: {config['output_dir']}")
     
-    # 保存配置到.env文件
+    # 保存配置到.env文件；在请求中完成，整理、查看和下载随即使用新的输出目录，失败时也能提示用户
     save_config_to_env(config)
     
     # 重置进度信息
-    progress = {
+    new_progress = {
         'total': 0,
         'current': 0,
         'status': '正在运行',
-        'start_time': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'start_time': datetime.now().strftime(_TS_FMT),
         'end_time': None,
-        'log_messages': [],
+        'log_messages': web_log_handler.messages,
+        'log_seq': web_log_handler.seq,
         'pages_count': 0,
         'images_count': 0,
         'error_count': 0,
-        'processing_speed': 0
+        'processing_speed': 0,
+        '_ver': progress['_ver'] + 1
     }
+    with progress_changed:
+        progress = new_progress
+        progress_changed.notify_all()
     
-    # 设置日志级别
+    # 设置日志级别；setup_logging会移除根日志记录器上的所有处理器，需要重新添加Web日志处理器
     setup_logging(config['log_level'])
+    logging.getLogger().addHandler(web_log_handler)
     
-    # 创建输出目录
-    os.makedirs(config['output_dir'], exist_ok=True)
-    
-    # 在新线程中启动抓取任务
+    # 在新线程中启动抓取任务，创建目录也放到后台线程，请求可以立即返回
     def run_fetcher():
-        global is_running, progress
         try:
-            is_running = True
+            # 创建输出目录
+            os.makedirs(config['output_dir'], exist_ok=True)
+            
             logging.info(f"开始抓取Wiki: {config['wiki_url']}")
             
             # 创建并启动Wiki抓取器
@@ -1200,21 +1827,23 @@ def start_fetcher_internal(form):
                 fetcher.start()
                 
                 logging.info(f"Wiki抓取完成。数据已保存到: {os.path.abspath(config['output_dir'])}")
-                progress['status'] = '已完成'
+                _set_progress('status', '已完成')
             except Exception as e:
                 logging.error(f"抓取器初始化或运行失败: {str(e)}", exc_info=True)
-                progress['status'] = '出错'
+                _set_progress('status', '出错')
                 raise
         except Exception as e:
             logging.error(f"抓取过程中发生错误: {str(e)}", exc_info=True)
-            progress['status'] = '出错'
+            _set_progress('status', '出错')
         finally:
-            is_running = False
-            progress['end_time'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            _set_progress('end_time', datetime.now().strftime(_TS_FMT))
     
-    fetcher_thread = threading.Thread(target=run_fetcher)
-    fetcher_thread.daemon = True
-    fetcher_thread.start()
+    with _task_lock:
+        if _is_running():
+            flash('任务已在运行中，请等待完成或停止当前任务', 'warning')
+            return redirect(url_for('index'))
+        _stop_event.clear()
+        _current_fetch = _start_background(run_fetcher, name='fetch')
     
     flash('抓取任务已启动', 'success')
     return redirect(url_for('index'))
@@ -1222,12 +1851,10 @@ def start_fetcher_internal(form):
 @app.route('/stop', methods=['POST'])
 def stop_fetcher():
     """停止抓取任务"""
-    global is_running, progress
-    
-    if is_running:
-        is_running = False
-        progress['status'] = '已停止'
-        progress['end_time'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    if _is_running():
+        _stop_event.set()
+        _set_progress('status', '已停止')
+        _set_progress('end_time', datetime.now().strftime(_TS_FMT))
         logging.info("抓取任务已手动停止")
         flash('抓取任务已停止', 'warning')
     else:
@@ -1238,10 +1865,10 @@ def stop_fetcher():
 @app.route('/organize', methods=['POST'])
 def organize_content():
     """整理Wiki内容"""
-    global organize_thread, is_organizing
+    global _current_organize
     
     # 如果已经在整理，则返回错误
-    if is_organizing:
+    if _is_organizing():
         flash('内容整理已在进行中，请等待完成', 'warning')
         return redirect(url_for('index'))
     
@@ -1260,20 +1887,16 @@ def organize_content():
         logging.info(f"创建输出目录: {output_dir}")
     
     # 检查输出目录是否为空
-    is_empty = True
-    for _, _, files in os.walk(output_dir):
-        if files:
-            is_empty = False
-            break
-    
-    if is_empty:
+    if not _has_files(output_dir):
         flash('输出目录为空，没有内容可以整理', 'warning')
         return redirect(url_for('index'))
     
-    # 在新线程中启动整理任务
-    organize_thread = threading.Thread(target=organize_wiki_content, args=(output_dir,))
-    organize_thread.daemon = True
-    organize_thread.start()
+    # 在后台线程中启动整理任务
+    with _task_lock:
+        if _is_organizing():
+            flash('内容整理已在进行中，请等待完成', 'warning')
+            return redirect(url_for('index'))
+        _current_organize = _start_background(organize_wiki_content, output_dir, name='organize')
     
     flash('开始整理Wiki内容，请稍候...', 'info')
     return redirect(url_for('index'))
@@ -1281,12 +1904,69 @@ def organize_content():
 @app.route('/progress')
 def get_progress():
     """获取进度信息"""
-    return jsonify(progress)
+    # 版本号和日志序号都未变化时返回304，不再重复序列化
+    etag = f"{progress['_ver']}-{web_log_handler.seq}"
+    if request.if_none_match.contains(etag):
+        response = app.response_class(status=304)
+    else:
+        with progress_lock:
+            data = dict(progress)
+        del data['_ver']
+        data['log_seq'], data['log_messages'] = web_log_handler.snapshot()
+        response = jsonify(data)
+    response.set_etag(etag)
+    # 浏览器每次轮询都需要重新验证
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@app.route('/events')
+def events():
+    """以Server-Sent Events推送进度和新增日志，只在有变化时发送
+    
+    事件id为日志序号，浏览器重连时通过Last-Event-ID继续接收之后的日志
+    """
+    since = request.headers.get('Last-Event-ID', type=int)
+    if since is None:
+        since = request.args.get('since', type=int)
+    
+    def generate(since):
+        last_ver = None
+        while True:
+            with progress_changed:
+                changed = progress_changed.wait_for(
+                    lambda: progress['_ver'] != last_ver or web_log_handler.seq != since, timeout=15)
+                if changed:
+                    last_ver = progress['_ver']
+                    data = dict(progress)
+            
+            if not changed:
+                # 保持连接，同时让服务端及时发现已断开的客户端
+                yield ': keepalive\n\n'
+                continue
+            
+            del data['_ver']
+            del data['log_messages']
+            data['reset'] = since is not None and since > web_log_handler.seq
+            data['log_seq'], data['logs'] = web_log_handler.snapshot(since)
+            since = data['log_seq']
+            yield f"id: {since}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+    
+    response = app.response_class(generate(since), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
 
 @app.route('/logs')
 def get_logs():
-    """获取日志消息"""
-    return jsonify(progress['log_messages'])
+    """获取日志消息
+    
+    带since参数时返回{'seq': 消息总数, 'logs': 序号大于since的消息}，否则返回全部消息列表
+    """
+    since = request.args.get('since', type=int)
+    seq, logs = web_log_handler.snapshot(since)
+    if since is None:
+        return jsonify(logs)
+    return jsonify({'seq': seq, 'logs': logs, 'reset': since > seq})
 
 @app.route('/download/<path:filename>')
 def download_file(filename):
@@ -1309,11 +1989,8 @@ def download_file(filename):
         flash(f'文件不存在: {filename}', 'danger')
         return redirect(url_for('index'))
     
-    # 获取文件所在目录
-    file_dir = os.path.dirname(file_path)
-    file_name = os.path.basename(file_path)
-    
-    return send_from_directory(file_dir, file_name, as_attachment=True)
+    # 支持条件请求，未修改时返回304；启用X-Sendfile时由前端服务器发送文件内容
+    return send_from_directory(output_dir, filename, as_attachment=True, conditional=True, etag=True)
 
 @app.route('/view_index')
 def view_index():
@@ -1338,11 +2015,20 @@ def view_index():
         flash('索引文件不存在，请先整理内容', 'warning')
         return redirect(url_for('index'))
     
-    return send_from_directory(organized_dir, 'index.html')
+    # 浏览器支持gzip且压缩版本不旧于原文件时，发送预先压缩的索引文件
+    gz_path = index_path + '.gz'
+    if ('gzip' in request.headers.get('Accept-Encoding', '') and os.path.exists(gz_path)
+            and os.path.getmtime(gz_path) >= os.path.getmtime(index_path)):
+        response = send_from_directory(organized_dir, 'index.html.gz', mimetype='text/html',
+                                       conditional=True, etag=True)
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        response = send_from_directory(organized_dir, 'index.html', conditional=True, etag=True)
+    response.vary.add('Accept-Encoding')
+    return response
 
-def save_config_to_env(config):
-    """保存配置到.env文件"""
-    env_content = """# GameWiki Fetcher 配置文件
+# .env文件内容模板
+_ENV_FMT = """# GameWiki Fetcher 配置文件
 # 此文件由Web界面自动生成，也可以手动编辑
 
 # Wiki URL
@@ -1377,17 +2063,52 @@ LOG_LEVEL="{log_level}"
 
 # 最大重试次数
 MAX_RETRIES={max_retries}
-""".format(**config)
+
+# 是否断点续爬
+RESUME={resume}
+"""
+
+# 上次写入.env的内容和写入后的修改时间，内容相同且文件未被改动时跳过写入
+_last_env_write = None
+
+def save_config_to_env(config):
+    """保存配置到.env文件
+    
+    先写入临时文件并fsync，再原子替换.env，不会留下写了一半的配置文件
+    """
+    global _last_env_write
+    
+    data = _ENV_FMT.format_map(config).encode('utf-8')
     
     # 保存到项目根目录的.env文件
-    env_path = os.path.join(root_dir, '.env')
+    env_path = ENV_PATH
     try:
-        with open(env_path, 'w', encoding='utf-8') as f:
-            f.write(env_content)
+        if _last_env_write is not None and _last_env_write[0] == data:
+            try:
+                if os.path.getmtime(env_path) == _last_env_write[1]:
+                    return
+            except OSError:
+                pass
+        
+        tmp_path = env_path + '.tmp'
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            mv = memoryview(data)
+            while mv:
+                n = os.write(fd, mv)
+                mv = mv[n:]
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        os.replace(tmp_path, env_path)
+        
+        _last_env_write = (data, os.path.getmtime(env_path))
+        _load_default_config_cached.cache_clear()
         logging.info(f"配置已保存到: {env_path}")
     except Exception as e:
         logging.error(f"保存配置文件失败: {str(e)}")
-        flash(f"保存配置文件失败: {str(e)}", 'danger')
+        if has_request_context():
+            flash(f"保存配置文件失败: {str(e)}", 'danger')
 
 @app.errorhandler(500)
 def internal_error(error):
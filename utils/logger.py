@@ -101,24 +101,41 @@ class LoggerAdapter(logging.LoggerAdapter):
             return f"[{self.prefix}] {msg}", kwargs
         return msg, kwargs 
 
+# 是否启用异常处理装饰器，可通过环境变量 STONESHARD_EXC_HANDLER=0 关闭
+EXCEPTION_HANDLER_ENABLED = os.environ.get('STONESHARD_EXC_HANDLER', '1').lower() not in ('0', 'false', 'no', 'off')
+
 # 新增：全局异常处理装饰器
-def exception_handler(func):
+def exception_handler(func=None, *, enabled=None):
     """全局异常处理装饰器
     
     捕获函数执行过程中的异常，记录详细日志，并可选择重新抛出
     
+    可直接使用 @exception_handler，也可使用 @exception_handler(enabled=False)。
+    未启用时直接返回原函数，不增加额外的调用开销。
+    
     Args:
         func: 要装饰的函数
+        enabled (bool, optional): 是否启用，默认读取 EXCEPTION_HANDLER_ENABLED
     
     Returns:
         装饰后的函数
     """
+    if enabled is None:
+        enabled = EXCEPTION_HANDLER_ENABLED
+    
+    if func is None:
+        return functools.partial(exception_handler, enabled=enabled)
+    
+    if not enabled:
+        return func
+    
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
-        logger = logging.getLogger('stoneshard')
         try:
             return func(*args, **kwargs)
         except Exception as e:
+            logger = logging.getLogger('stoneshard')
+            
             # 获取详细的异常信息
             exc_info = sys.exc_info()
             stack_trace = ''.join(traceback.format_exception(*exc_info))
@@ -141,6 +158,8 @@ class ContextLogger:
     
     在日志消息中添加上下文信息，如模块名、函数名等
     
+    前缀直接拼接到消息中，任何处理器和格式都能看到；级别未启用时不做拼接。
+    
     Example:
         logger = ContextLogger('processor', 'character')
         logger.info('处理角色数据')  # 输出: [processor:character] 处理角色数据
@@ -156,30 +175,40 @@ class ContextLogger:
         self.module_name = module_name
         self.component_name = component_name
         self.logger = logging.getLogger('stoneshard')
-    
-    def _format_message(self, message):
-        """格式化消息，添加上下文信息"""
-        context = self.module_name
-        if self.component_name:
-            context += f":{self.component_name}"
-        return f"[{context}] {message}"
+        
+        # 预先计算前缀并缓存绑定方法，避免每次记录日志时重复查找
+        context = module_name
+        if component_name:
+            context += f":{component_name}"
+        self._prefix = f"[{context}] "
+        
+        l = self.logger
+        self._debug, self._info, self._warning, self._error, self._critical = (
+            l.debug, l.info, l.warning, l.error, l.critical
+        )
+        self._is_enabled = l.isEnabledFor
     
     def debug(self, message, *args, **kwargs):
         """记录调试级别日志"""
-        self.logger.debug(self._format_message(message), *args, **kwargs)
+        if self._is_enabled(logging.DEBUG):
+            self._debug(self._prefix + str(message), *args, **kwargs)
     
     def info(self, message, *args, **kwargs):
         """记录信息级别日志"""
-        self.logger.info(self._format_message(message), *args, **kwargs)
+        if self._is_enabled(logging.INFO):
+            self._info(self._prefix + str(message), *args, **kwargs)
     
     def warning(self, message, *args, **kwargs):
         """记录警告级别日志"""
-        self.logger.warning(self._format_message(message), *args, **kwargs)
+        if self._is_enabled(logging.WARNING):
+            self._warning(self._prefix + str(message), *args, **kwargs)
     
     def error(self, message, *args, **kwargs):
         """记录错误级别日志"""
-        self.logger.error(self._format_message(message), *args, **kwargs)
+        if self._is_enabled(logging.ERROR):
+            self._error(self._prefix + str(message), *args, **kwargs)
     
     def critical(self, message, *args, **kwargs):
         """记录严重错误级别日志"""
-        self.logger.critical(self._format_message(message), *args, **kwargs) 
\ No newline at end of file
+        if self._is_enabled(logging.CRITICAL):
+            self._critical(self._prefix + str(message), *args, **kwargs)
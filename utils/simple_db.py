@@ -7,14 +7,43 @@
 """
 
 import os
+import gzip
+import asyncio
+import functools
 import json
 import logging
+import threading
+from collections import defaultdict
 from pathlib import Path
 from datetime import datetime
 
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+try:
+    import msgpack
+    MSGPACK_AVAILABLE = True
+except ImportError:
+    MSGPACK_AVAILABLE = False
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+# 导出文件中始终包含的集合，即使其中没有数据
+_EXPORT_COLLECTIONS = ("character", "skill", "item", "relation")
+
 class DatabaseManager:
     """简化版数据库管理器"""
     
+    # 已确认存在的导出目录，避免重复调用os.makedirs
+    _dirs_created = set()
+    
     def __init__(self, config):
         """初始化数据库管理器
         
@@ -23,15 +52,62 @@ class DatabaseManager:
         """
         self.config = config
         self.logger = logging.getLogger('stoneshard')
-        self.logger.info("初始化简化版数据库管理器")
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug("初始化简化版数据库管理器")
+        
+        # 内存中的数据缓存：以 (集合名称, 数据ID) 为键的扁平字典
+        self._store = {}
+        
+        # 按集合维护的数据列表及其在列表中的位置，供get_all直接返回
+        # 集合在首次写入时才创建
+        self._by_coll = defaultdict(list)
+        self._positions = {}
+        
+        # 每个集合一把锁，多线程写入不同集合时互不阻塞
+        self._locks = defaultdict(threading.Lock)
         
-        # 内存中的数据缓存
-        self.data = {
-            "character": {},
-            "skill": {},
-            "item": {},
-            "relation": {}
-        }
+        # 自上次增量导出以来修改过的数据ID
+        self._dirty = defaultdict(set)
+    
+    @property
+    def data(self):
+        """按集合嵌套的数据视图 {集合名称: {数据ID: 数据}}，用于导出
+        
+        在持有所有集合锁时复制数据，导出期间其他线程可以继续保存。
+        """
+        collections = list(self._by_coll)
+        locks = [self._locks[collection] for collection in collections]
+        for lock in locks:
+            lock.acquire()
+        try:
+            store = self._store.copy()
+        finally:
+            for lock in reversed(locks):
+                lock.release()
+        
+        data = {collection: {} for collection in _EXPORT_COLLECTIONS}
+        data.update((collection, {}) for collection in collections if collection not in data)
+        for (collection, data_id), item in store.items():
+            data.setdefault(collection, {})[data_id] = item
+        return data
+    
+    def _put(self, collection, data_id, data, dirty=False):
+        """写入一条数据，同时维护集合列表
+        
+        dirty为True时记录到增量导出列表中
+        """
+        key = (collection, data_id)
+        items = self._by_coll[collection]
+        with self._locks[collection]:
+            pos = self._positions.get(key)
+            if pos is None:
+                self._positions[key] = len(items)
+                items.append(data)
+            else:
+                items[pos] = data
+            self._store[key] = data
+            if dirty:
+                self._dirty[collection].add(data_id)
     
     def save(self, collection, data, id_field="id"):
         """保存数据
@@ -46,13 +122,46 @@ class DatabaseManager:
         """
         data_id = data.get(id_field)
         if not data_id:
-            self.logger.warning(f"保存数据失败: 缺少ID字段 {id_field}")
+            if self.logger.isEnabledFor(logging.DEBUG):
+                self.logger.debug(f"保存数据失败: 缺少ID字段 {id_field}")
             return False
         
         # 保存到内存
-        self.data[collection][data_id] = data
+        self._put(collection, data_id, data, dirty=True)
         return True
     
+    def save_many(self, collection, records, id_field="id"):
+        """批量保存数据
+        
+        整批只获取一次锁，缺少ID字段的记录会被跳过。
+        
+        Args:
+            collection (str): 集合名称
+            records (iterable): 要保存的数据
+            id_field (str, optional): ID字段名称
+        
+        Returns:
+            int: 成功保存的数量
+        """
+        pairs = [(r.get(id_field), r) for r in records]
+        pairs = [(data_id, r) for data_id, r in pairs if data_id]
+        
+        store = self._store
+        positions = self._positions
+        items = self._by_coll[collection]
+        with self._locks[collection]:
+            for data_id, data in pairs:
+                key = (collection, data_id)
+                pos = positions.get(key)
+                if pos is None:
+                    positions[key] = len(items)
+                    items.append(data)
+                else:
+                    items[pos] = data
+            store.update(((collection, data_id), data) for data_id, data in pairs)
+            self._dirty[collection].update(data_id for data_id, _ in pairs)
+        return len(pairs)
+    
     def get(self, collection, data_id):
         """获取数据
         
@@ -63,7 +172,7 @@ class DatabaseManager:
         Returns:
             dict: 数据项
         """
-        return self.data[collection].get(data_id)
+        return self._store.get((collection, data_id))
     
     def get_all(self, collection):
         """获取集合中的所有数据
@@ -72,26 +181,170 @@ class DatabaseManager:
             collection (str): 集合名称
         
         Returns:
-            list: 数据项列表
+            list: 数据项列表（内部列表的引用，调用方不应修改）
+        """
+        return self._by_coll.get(collection, [])
+    
+    def _ensure_dir(self, output_path):
+        """确保输出文件所在目录存在，每个目录只创建一次"""
+        output_dir = os.path.dirname(os.path.abspath(output_path))
+        if output_dir and output_dir not in DatabaseManager._dirs_created:
+            os.makedirs(output_dir, exist_ok=True)
+            DatabaseManager._dirs_created.add(output_dir)
+    
+    def _export_target(self, output_path):
+        """根据输出路径确定压缩方式
+        
+        Returns:
+            tuple: (实际输出路径, 压缩方式)，压缩方式为 'zstd'、'gzip' 或 None
         """
-        return list(self.data[collection].values())
+        compression = None
+        if output_path.endswith('.zst'):
+            if ZSTD_AVAILABLE:
+                compression = 'zstd'
+            else:
+                self.logger.warning("未安装zstandard，改用gzip压缩导出数据")
+                output_path = output_path[:-len('.zst')] + '.gz'
+                compression = 'gzip'
+        elif output_path.endswith('.gz'):
+            compression = 'gzip'
+        return output_path, compression
     
-    def export_all(self, output_path):
+    def _encode(self, pretty=False, format="json"):
+        """复制当前数据并序列化为字节串"""
+        data = self.data
+        if format == "msgpack":
+            if not MSGPACK_AVAILABLE:
+                raise ImportError("导出msgpack格式需要安装msgpack")
+            return msgpack.packb(data, use_bin_type=True)
+        if ORJSON_AVAILABLE:
+            option = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+            if pretty:
+                option |= orjson.OPT_INDENT_2
+            return orjson.dumps(data, option=option)
+        if pretty:
+            return json.dumps(data, indent=2, ensure_ascii=False).encode('utf-8')
+        return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    
+    def _write_export(self, output_path, payload, compression):
+        """压缩导出内容并写入文件"""
+        # 确保目录存在
+        self._ensure_dir(output_path)
+        
+        # 压缩导出内容
+        if compression == 'zstd':
+            payload = zstandard.ZstdCompressor(level=3, threads=-1).compress(payload)
+        elif compression == 'gzip':
+            payload = gzip.compress(payload, compresslevel=1)
+        
+        # 先整块写入临时文件并fsync，再原子替换目标文件，避免留下写了一半的文件
+        tmp_path = output_path + '.tmp'
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            mv = memoryview(payload)
+            while mv:
+                n = os.write(fd, mv)
+                mv = mv[n:]
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        os.replace(tmp_path, output_path)
+        
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug(f"已导出所有数据到 {output_path}")
+    
+    def export_all(self, output_path, pretty=False, format="json"):
         """导出所有数据
         
+        输出路径以 .zst 或 .gz 结尾时对导出内容进行压缩。未安装zstandard时，
+        .zst 输出会退化为gzip压缩，并改写为 .gz 路径。
+        
         Args:
             output_path (str): 输出文件路径
+            pretty (bool, optional): 是否缩进美化JSON输出，默认输出紧凑格式
+            format (str, optional): 导出格式，可选值：json, msgpack
+        
+        Returns:
+            str: 实际写入的文件路径
         """
-        # 确保目录存在
-        os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+        output_path, compression = self._export_target(output_path)
+        self._write_export(output_path, self._encode(pretty, format), compression)
+        return output_path
+    
+    async def export_all_async(self, output_path, pretty=False, format="json"):
+        """异步导出所有数据
+        
+        数据快照和序列化在调用线程中完成，只有压缩和写盘放到默认线程池中执行，
+        调用方可以在写盘的同时继续处理数据。
+        
+        Args:
+            output_path (str): 输出文件路径
+            pretty (bool, optional): 是否缩进美化JSON输出，默认输出紧凑格式
+            format (str, optional): 导出格式，可选值：json, msgpack
         
-        # 导出数据
-        with open(output_path, 'w', encoding='utf-8') as f:
-            json.dump(self.data, f, indent=2, ensure_ascii=False)
+        Returns:
+            str: 实际写入的文件路径
+        """
+        output_path, compression = self._export_target(output_path)
+        payload = self._encode(pretty, format)
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(
+            None, functools.partial(self._write_export, output_path, payload, compression)
+        )
+        return output_path
+    
+    def export_delta(self, output_path):
+        """增量导出自上次导出以来修改过的数据
+        
+        以追加方式写入，每行一条JSON记录，格式为 {"c": 集合名称, "i": 数据ID, "d": 数据}
+        
+        Args:
+            output_path (str): 输出文件路径
+        """
+        self._ensure_dir(output_path)
+        
+        # 在各集合的锁内取出并清空修改记录，同时复制对应的数据
+        records = []
+        for collection in list(self._dirty):
+            with self._locks[collection]:
+                ids = self._dirty[collection]
+                if not ids:
+                    continue
+                self._dirty[collection] = set()
+                records.extend(
+                    {'c': collection, 'i': data_id, 'd': self._store[(collection, data_id)]}
+                    for data_id in ids
+                )
+        
+        buf = bytearray()
+        for record in records:
+            if ORJSON_AVAILABLE:
+                buf += orjson.dumps(record, option=orjson.OPT_NON_STR_KEYS)
+            else:
+                buf += json.dumps(record, ensure_ascii=False).encode('utf-8')
+            buf += b'\n'
+        
+        if buf:
+            with open(output_path, 'ab') as f:
+                f.write(buf)
+    
+    def load_delta(self, input_path):
+        """从增量导出文件回放数据
+        
+        Args:
+            input_path (str): 增量导出文件路径
+        """
+        if not os.path.exists(input_path):
+            return
         
-        self.logger.info(f"已导出所有数据到 {output_path}")
+        loads = orjson.loads if ORJSON_AVAILABLE else json.loads
+        with open(input_path, 'rb') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                record = loads(line)
+                self._put(record['c'], record['i'], record['d'])
     
     def close(self):
-        """关闭数据库连接"""
-        # 简化版不需要关闭连接
-        pass 
\ No newline at end of file
+        """关闭数据库连接（简化版不需要关闭连接）"""
\ No newline at end of file